@@ -0,0 +1,48 @@
+# Generated by Django 4.1.7 on 2026-10-15 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_viewcount_viewcount_blog_viewco_viewed__0b448b_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='app_article_search__8c4d79_gin'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE FUNCTION tg_article_tsvector() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector :=
+                        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+                        setweight(to_tsvector('russian', coalesce(NEW.full_description, '')), 'B');
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER tg_article_tsvector
+                    BEFORE INSERT OR UPDATE OF title, full_description ON app_articles
+                    FOR EACH ROW EXECUTE FUNCTION tg_article_tsvector();
+
+                UPDATE app_articles SET search_vector =
+                    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('russian', coalesce(full_description, '')), 'B');
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS tg_article_tsvector ON app_articles;
+                DROP FUNCTION IF EXISTS tg_article_tsvector();
+            """,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-15 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_article_search_vector_article_app_article_search__8c4d79_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Рейтинг'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE app_articles SET rating_sum = (
+                    SELECT COALESCE(SUM(value), 0) FROM blog_rating WHERE blog_rating.article_id = app_articles.id
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
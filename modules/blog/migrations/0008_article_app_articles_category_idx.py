@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-15 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('blog', '0007_article_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', 'status', '-fixed', '-time_create'], name='app_articles_category_idx'),
+        ),
+        # Индекс промежуточной таблицы тегов (модель taggit) для выборок статей по тегу
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX IF NOT EXISTS taggit_taggeditem_tag_object_idx
+                    ON taggit_taggeditem (tag_id, content_type_id, object_id);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS taggit_taggeditem_tag_object_idx;
+            """,
+        ),
+    ]
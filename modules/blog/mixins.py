@@ -1,5 +1,19 @@
+from datetime import datetime, timezone
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from kombu.exceptions import OperationalError
+
 from .models import ViewCount
-from modules.services.utils import get_client_ip
+from modules.services.tasks import create_view_count_task
+from modules.services.utils import get_client_ip, get_articles_last_modified
 
 
 class ViewCountMixin:
@@ -11,6 +25,98 @@ class ViewCountMixin:
         obj = super().get_object()
         # получаем IP-адрес пользователя
         ip_address = get_client_ip(self.request)
-        # получаем или создаем запись о просмотре статьи для данного пользователя
-        ViewCount.objects.get_or_create(article=obj, ip_address=ip_address)
-        return obj
\ No newline at end of file
+        # запись о просмотре создается в celery, повторные просмотры за сутки отсекаются кэшем без обращения к БД
+        cache_key = f'viewed-{obj.pk}-{ip_address}'
+        if cache.get(cache_key) is None:
+            try:
+                create_view_count_task.delay(obj.pk, ip_address)
+            except OperationalError:
+                # брокер недоступен: записываем просмотр синхронно, как раньше
+                ViewCount.objects.get_or_create(article=obj, ip_address=ip_address)
+            cache.set(cache_key, True, 60 * 60 * 24)
+        return obj
+
+
+class CursorPaginationMixin:
+    """
+    Миксин курсорной пагинации списка статей для глубоких страниц.
+    Первые страницы нумеруются обычным пагинатором, дальше ссылка "вперед"
+    содержит курсор (fixed, time_create, id) последней статьи и выборка идет
+    по ключу вместо OFFSET. Нумерованные страницы после cursor_after_page не отдаются.
+    """
+    cursor_kwarg = 'cursor'
+    cursor_after_page = 10
+    cursor_ordering = ('-fixed', '-time_create', '-id')
+    next_cursor = None
+
+    @staticmethod
+    def encode_cursor(obj):
+        return urlsafe_base64_encode(force_bytes(f'{int(obj.fixed)}|{obj.time_create.isoformat()}|{obj.pk}'))
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            fixed, time_create, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+            return bool(int(fixed)), datetime.fromisoformat(time_create), int(pk)
+        except ValueError:
+            raise Http404('Некорректный курсор страницы')
+
+    def paginate_queryset(self, queryset, page_size):
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if cursor is None:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            # глубокие страницы доступны только по курсору, без OFFSET
+            if page.number > self.cursor_after_page:
+                raise Http404('Страница доступна только по курсору')
+            page.object_list = list(page.object_list)
+            if page.number >= self.cursor_after_page and page.has_next():
+                self.next_cursor = self.encode_cursor(page.object_list[-1])
+            return paginator, page, page.object_list, is_paginated
+
+        fixed, time_create, pk = self.decode_cursor(cursor)
+        object_list = list(queryset.filter(
+            Q(fixed__lt=fixed)
+            | Q(fixed=fixed, time_create__lt=time_create)
+            | Q(fixed=fixed, time_create=time_create, id__lt=pk)
+        )[:page_size + 1])
+        if not object_list and not self.get_allow_empty():
+            raise Http404('Пустая страница')
+        if len(object_list) > page_size:
+            object_list = object_list[:page_size]
+            self.next_cursor = self.encode_cursor(object_list[-1])
+        return None, None, object_list, True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        context['cursor_after_page'] = self.cursor_after_page
+        # на страницах по курсору ссылка "назад" ведет на последнюю нумерованную страницу
+        context['cursor_back_page'] = self.cursor_after_page if self.request.GET.get(self.cursor_kwarg) else None
+        return context
+
+
+class AnonymousCacheMixin:
+    """
+    Миксин кэширования страниц для неавторизованных пользователей:
+    ответ 304 по If-Modified-Since и кэш страницы через cache_page.
+    Время изменения обновляется сигналами статей (touch_articles_last_modified) и не меньше начала
+    текущего интервала cache_timeout: счетчики оценок и просмотров устаревают не дольше cache_timeout
+    """
+    cache_timeout = 60
+
+    def dispatch(self, request, *args, **kwargs):
+        # авторизованным и посетителям с flash-сообщениями отдаем страницу без кэша
+        if not request.user.is_anonymous or len(get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+        now = datetime.now(timezone.utc).timestamp()
+        last_modified = max(
+            get_articles_last_modified(),
+            datetime.fromtimestamp(now - now % self.cache_timeout, tz=timezone.utc),
+        )
+        # версия кэша страницы привязана ко времени изменения, чтобы под новым Last-Modified не отдать старую страницу
+        view = cache_page(self.cache_timeout, key_prefix=f'articles-{last_modified.timestamp()}')(super().dispatch)
+        view = condition(last_modified_func=lambda request, *args, **kwargs: last_modified)(view)
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Cookie',))
+        return response
@@ -1,18 +1,52 @@
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, Concat
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
+from django.core.cache import cache
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from mptt.models import MPTTModel, TreeForeignKey
 from modules.services.utils import unique_slugify
 from pytils.translit import slugify
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 from django_ckeditor_5.fields import CKEditor5Field
-from modules.services.utils import unique_slugify, image_compress
+from modules.services.utils import unique_slugify, image_compress, reset_paginator_count_cache, \
+    touch_articles_last_modified, bump_cache_version
 from datetime import date
+from urllib.parse import quote
 
 User = get_user_model()
 
+# Ключ кэша похожих статей (список словарей) для ArticleDetailView, версия общая для всех статей
+SIMILAR_ARTICLES_CACHE_KEY = 'similar:v1:{version}:{pk}'
+SIMILAR_ARTICLES_VERSION_KEY = 'similar-version'
+# Ключи кэша id и названия категории/тега по slug для списков статей
+CATEGORY_SLUG_CACHE_KEY = 'category-slug:{slug}'
+TAG_SLUG_CACHE_KEY = 'tag-slug:{slug}'
+
+
+def get_similar_articles_cache_key(pk):
+    """
+    Ключ кэша похожих статей с текущей версией
+    """
+    version = cache.get_or_set(SIMILAR_ARTICLES_VERSION_KEY, 1, None)
+    return SIMILAR_ARTICLES_CACHE_KEY.format(version=version, pk=pk)
+
+
+def reset_similar_articles_cache():
+    """
+    Сброс кэша похожих статей всех статей (смена версии ключей): статья может быть в списках других статей
+    """
+    bump_cache_version(SIMILAR_ARTICLES_VERSION_KEY)
+
+
 class Category(MPTTModel):
     """
     Модель категорий с вложенностью
@@ -67,7 +101,25 @@ class Article(models.Model):
             """
             Список статей (SQL запрос с фильтрацией для страницы списка статей)
             """
-            return self.get_queryset().select_related('author', 'category').prefetch_related('ratings', 'views').filter(status='published')
+            return self.get_queryset()\
+                .select_related('author', 'author__profile', 'category')\
+                .prefetch_related('views')\
+                .filter(status='published')
+
+        def for_list(self):
+            """
+            Список статей только с полями для карточек (без полного описания),
+            URL превью и количество просмотров считаются в SQL запросе (thumb_url, view_count)
+            """
+            view_count = ViewCount.objects.filter(article=models.OuterRef('pk'))\
+                .order_by().values('article').annotate(count=Count('id')).values('count')
+            return self.all().prefetch_related(None).only(
+                'id', 'title', 'slug', 'short_description', 'thumbnail', 'time_create', 'fixed', 'rating_sum',
+                'author__username', 'author__profile__slug', 'category__title', 'category__slug',
+            ).annotate(
+                thumb_url=Concat(Value(settings.MEDIA_URL), 'thumbnail', output_field=models.CharField()),
+                view_count=Coalesce(models.Subquery(view_count), 0),
+            )
 
         def detail(self):
             """
@@ -75,7 +127,7 @@ class Article(models.Model):
             """
             return self.get_queryset()\
                 .select_related('author', 'category')\
-                .prefetch_related('comments', 'comments__author', 'comments__author__profile', 'tags', 'ratings')\
+                .prefetch_related('comments', 'comments__author', 'comments__author__profile', 'tags')\
                 .filter(status='published')
 
 
@@ -101,6 +153,10 @@ class Article(models.Model):
     updater = models.ForeignKey(to=User, verbose_name='Обновил', on_delete=models.SET_NULL, null=True, related_name='updater_posts', blank=True)
     fixed = models.BooleanField(verbose_name='Зафиксировано', default=False)
     category = TreeForeignKey('Category', on_delete=models.PROTECT, related_name='articles', verbose_name='Категория')
+    # Сумма оценок, обновляется через F() выражения в RatingCreateView и при удалении оценок (сигнал)
+    rating_sum = models.IntegerField(verbose_name='Рейтинг', default=0, editable=False)
+    # Заполняется триггером tg_article_tsvector в БД (title - вес A, full_description - вес B)
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True, editable=False)
 
     tags = TaggableManager()
     objects = ArticleManager()
@@ -108,7 +164,11 @@ class Article(models.Model):
     class Meta:
         db_table = 'app_articles'
         ordering = ['-fixed', '-time_create']
-        indexes = [models.Index(fields=['-fixed', '-time_create', 'status'])]
+        indexes = [
+            models.Index(fields=['-fixed', '-time_create', 'status']),
+            models.Index(fields=['category', 'status', '-fixed', '-time_create'], name='app_articles_category_idx'),
+            GinIndex(fields=['search_vector']),
+        ]
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
 
@@ -135,7 +195,7 @@ class Article(models.Model):
 
 
     def get_sum_rating(self):
-        return sum([rating.value for rating in self.ratings.all()])
+        return self.rating_sum
 
     def get_view_count(self):
         """
@@ -195,8 +255,8 @@ class Comment(MPTTModel):
     @property
     def get_avatar(self):
         if self.author:
-            return self.author.profile.get_avatar
-        return f'https://ui-avatars.com/api/?size=190&background=random&name={self.name}'
+            return self.author.profile.avatar.url
+        return f'https://ui-avatars.com/api/?size=190&background=random&name={quote(self.name)}'
 
 
 class Rating(models.Model):
@@ -235,4 +295,72 @@ class ViewCount(models.Model):
         verbose_name_plural = 'Просмотры'
 
     def __str__(self):
-        return self.article.title
\ No newline at end of file
+        return self.article.title
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def clear_similar_articles_cache(sender, instance, **kwargs):
+    """
+    Сброс кэша похожих статей при изменении или удалении статьи
+    """
+    reset_similar_articles_cache()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def clear_article_list_cache(sender, instance, **kwargs):
+    """
+    Сброс кэша количества статей и обновление Last-Modified списков при изменении или удалении статьи
+    """
+    reset_paginator_count_cache()
+    touch_articles_last_modified()
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def clear_similar_articles_cache_on_tags(sender, instance, action, **kwargs):
+    """
+    Сброс кэша похожих статей и количества статей по тегам при изменении тегов статьи
+    """
+    if isinstance(instance, Article) and action in ('post_add', 'post_remove', 'post_clear'):
+        reset_similar_articles_cache()
+        reset_paginator_count_cache()
+        touch_articles_last_modified()
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+def remember_previous_slug(sender, instance, **kwargs):
+    """
+    Запоминаем прежний slug категории/тега, чтобы сбросить кэш и по старому адресу
+    """
+    instance._previous_slug = sender.objects.filter(pk=instance.pk).values_list('slug', flat=True).first() \
+        if instance.pk else None
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def clear_category_slug_cache(sender, instance, **kwargs):
+    """
+    Сброс кэша категории по текущему и прежнему slug при изменении или удалении категории
+    """
+    cache.delete_many([CATEGORY_SLUG_CACHE_KEY.format(slug=slug)
+                       for slug in {instance.slug, getattr(instance, '_previous_slug', None)} if slug])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def clear_tag_slug_cache(sender, instance, **kwargs):
+    """
+    Сброс кэша тега по текущему и прежнему slug при изменении или удалении тега
+    """
+    cache.delete_many([TAG_SLUG_CACHE_KEY.format(slug=slug)
+                       for slug in {instance.slug, getattr(instance, '_previous_slug', None)} if slug])
+
+
+@receiver(post_delete, sender=Rating)
+def subtract_deleted_rating(sender, instance, **kwargs):
+    """
+    Вычитание удаленной оценки из суммы рейтинга статьи (RatingCreateView, админка, каскадное удаление)
+    """
+    Article.objects.filter(pk=instance.article_id).update(rating_sum=F('rating_sum') - instance.value)
@@ -1,33 +1,41 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.shortcuts import redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 
-from .mixins import ViewCountMixin
-from .models import Article, Category, Comment, Rating
-from django.core.paginator import Paginator
+from .mixins import ViewCountMixin, CursorPaginationMixin, AnonymousCacheMixin
+from .models import Article, Category, Comment, Rating, CATEGORY_SLUG_CACHE_KEY, TAG_SLUG_CACHE_KEY, \
+    get_similar_articles_cache_key
+from django.core.cache import cache
+from django.contrib.contenttypes.models import ContentType
 from .forms import ArticleCreateForm, ArticleUpdateForm, CommentCreateForm
 from django.urls import reverse_lazy
+from django.utils.formats import date_format
+from django.utils.timezone import localtime
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from ..services.mixins import AuthorRequiredMixin
 from taggit.models import Tag
 import random
-from django.db.models import Count
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import Count, F
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.views.generic import View
-from ..services.utils import get_client_ip
+from ..services.utils import get_client_ip, CachedCountPaginator
 
 
 
 
-class ArticleListView(ListView):
+class ArticleListView(AnonymousCacheMixin, CursorPaginationMixin, ListView):
     model = Article
     template_name = 'blog/articles_list.html'
     context_object_name = 'articles'
     allow_empty = False
     paginate_by = 10
     paginate_orphans = 0
-    paginator_class = Paginator
+    paginator_class = CachedCountPaginator
+
+    def get_queryset(self):
+        return Article.objects.for_list()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -40,22 +48,46 @@ class ArticleDetailView(ViewCountMixin, DetailView):
     context_object_name = 'article'
 
     def get_similar_articles(self, obj):
-        article_tags_ids = obj.tags.values_list('id', flat=True)
-        similar_articles = Article.objects.filter(tags__in=article_tags_ids).exclude(id=obj.id)
-        similar_articles = similar_articles.annotate(related_tags=Count('tags')).order_by('-related_tags')
-        similar_articles_list = list(similar_articles.all())
-        random.shuffle(similar_articles_list)
-        return similar_articles_list[:6]
+        """
+        Похожие статьи: 20 лучших совпадений по тегам кэшируются на час, из них выбираются случайные 6
+        """
+        cache_key = get_similar_articles_cache_key(obj.pk)
+        similar_articles_list = cache.get(cache_key)
+        if similar_articles_list is None:
+            # агрегация только по промежуточной таблице тегов, без соединения со статьями
+            matching = Article.tags.through.objects\
+                .filter(content_type=ContentType.objects.get_for_model(Article), tag_id__in=obj.tags.values('id'))\
+                .exclude(object_id=obj.id)\
+                .values('object_id')\
+                .annotate(related_tags=Count('tag_id'))\
+                .order_by('-related_tags')[:20]
+            similar_articles = Article.objects.filter(id__in=[m['object_id'] for m in matching], status='published')
+            similar_articles = similar_articles.select_related('author', 'author__profile')\
+                .only('id', 'title', 'slug', 'thumbnail', 'time_create', 'author__username', 'author__profile__slug')
+            similar_articles_list = [
+                {
+                    'id': article.id,
+                    'title': article.title,
+                    'get_absolute_url': article.get_absolute_url(),
+                    'thumbnail_url': article.thumbnail.url if article.thumbnail else '',
+                    'time_create': article.time_create,
+                    'author': article.author.username,
+                    'author_slug': article.author.profile.slug,
+                }
+                for article in similar_articles
+            ]
+            cache.set(cache_key, similar_articles_list, 60 * 60)
+        return random.sample(similar_articles_list, min(len(similar_articles_list), 6))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = self.object.title
-        context['form'] = CommentCreateForm
+        context['form'] = CommentCreateForm()
         context['similar_articles'] = self.get_similar_articles(self.object)
 
         return context
 
-class ArticleByCategoryListView(ListView):
+class ArticleByCategoryListView(AnonymousCacheMixin, ListView):
     model = Article
     template_name = 'blog/articles_list.html'
     context_object_name = 'articles'
@@ -63,16 +95,22 @@ class ArticleByCategoryListView(ListView):
     allow_empty = False
     paginate_by = 10
     paginate_orphans = 0
-    paginator_class = Paginator
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        self.category = Category.objects.get(slug=self.kwargs['slug'])
-        queryset = Article.objects.all().filter(category__slug=self.category.slug)
+        cache_key = CATEGORY_SLUG_CACHE_KEY.format(slug=self.kwargs['slug'])
+        self.category = cache.get(cache_key)
+        if self.category is None:
+            self.category = Category.objects.filter(slug=self.kwargs['slug']).values('id', 'title').first()
+            if self.category is None:
+                raise Http404
+            cache.set(cache_key, self.category, 60 * 60)
+        queryset = Article.objects.for_list().filter(category_id=self.category['id'])
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['title'] = f'Статьи из категории: {self.category.title}'
+        context['title'] = f'Статьи из категории: {self.category["title"]}'
         return context
 
 class ArticleCreateView(LoginRequiredMixin, CreateView):
@@ -125,7 +163,9 @@ class ArticleDeleteView(AuthorRequiredMixin, DeleteView):
     success_url = reverse_lazy('blog:home')
     context_object_name = 'article'
     template_name = 'blog/articles_delete.html'
-    queryset = model.objects.detail()
+
+    def get_queryset(self):
+        return Article.objects.filter(status='published').select_related('author').only('id', 'title', 'slug', 'thumbnail', 'author')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -153,49 +193,60 @@ class CommentCreateView(CreateView):
 
         comment.parent_id = form.cleaned_data.get('parent')
         comment.save()
+        is_child = comment.parent_id is not None
 
         if self.is_ajax():
             if self.request.user.is_authenticated:
                 data = {
-                    'is_child': comment.is_child_node(),
+                    'is_child': is_child,
                     'id': comment.id,
-                    'author': comment.author.username,
+                    'author': self.request.user.username,
                     'parent_id': comment.parent_id,
-                    'time_create': comment.time_create.strftime('%Y-%b-%d %H:%M:%S'),
+                    'time_create': comment.time_create.isoformat(timespec='seconds'),
+                    'time_create_display': date_format(localtime(comment.time_create), 'DATETIME_FORMAT'),
                     'avatar': comment.get_avatar,
                     'content': comment.content,
-                    'get_absolute_url': comment.author.profile.get_absolute_url()
+                    'get_absolute_url': self.request.user.profile.get_absolute_url()
                 }
             else:
                 data = {
-                    'is_child': comment.is_child_node(),
+                    'is_child': is_child,
                     'id': comment.id,
                     'author': comment.name,
                     'parent_id': comment.parent_id,
-                    'time_create': comment.time_create.strftime('%Y-%b-%d %H:%M:%S'),
+                    'time_create': comment.time_create.isoformat(timespec='seconds'),
+                    'time_create_display': date_format(localtime(comment.time_create), 'DATETIME_FORMAT'),
                     'avatar': comment.get_avatar,
                     'content': comment.content,
                     'get_absolute_url': f'mailto:{comment.email}'
                 }
             return JsonResponse(data, status=200)
 
-        return redirect(comment.article.get_absolute_url())
+        article_slug = Article.objects.values_list('slug', flat=True).get(pk=comment.article_id)
+        return redirect('blog:articles_detail', slug=article_slug)
 
-class ArticleByTagListView(ListView):
+class ArticleByTagListView(AnonymousCacheMixin, ListView):
     model = Article
     template_name = 'blog/articles_list.html'
     context_object_name = 'articles'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
     tag = None
 
     def get_queryset(self):
-        self.tag = Tag.objects.get(slug=self.kwargs['tag'])
-        queryset = Article.objects.all().filter(tags__slug=self.tag.slug)
+        cache_key = TAG_SLUG_CACHE_KEY.format(slug=self.kwargs['tag'])
+        self.tag = cache.get(cache_key)
+        if self.tag is None:
+            self.tag = Tag.objects.filter(slug=self.kwargs['tag']).values('id', 'name').first()
+            if self.tag is None:
+                raise Http404
+            cache.set(cache_key, self.tag, 60 * 60)
+        queryset = Article.objects.for_list().filter(tags__id=self.tag['id'])
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['title'] = f'Статьи по тегу: {self.tag.name}'
+        context['title'] = f'Статьи по тегу: {self.tag["name"]}'
         return context
 
 class ArticleSearchResultView(ListView):
@@ -205,14 +256,19 @@ class ArticleSearchResultView(ListView):
     model = Article
     context_object_name = 'articles'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
     allow_empty = True
     template_name = 'blog/articles_list.html'
 
     def get_queryset(self):
-        query = self.request.GET.get('do')
-        search_vector = SearchVector('full_description', weight='B') + SearchVector('title', weight='A')
-        search_query = SearchQuery(query)
-        return (self.model.objects.annotate(rank=SearchRank(search_vector, search_query)).filter(rank__gte=0.3).order_by('-rank'))
+        query = (self.request.GET.get('do') or '').strip()
+        if not query:
+            return self.model.objects.none()
+        search_query = SearchQuery(query, config='russian', search_type='websearch')
+        return (self.model.objects.for_list()
+                .filter(search_vector=search_query)
+                .annotate(rank=SearchRank(F('search_vector'), search_query))
+                .order_by('-rank'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -232,19 +288,25 @@ class RatingCreateView(View):
         ip_address = get_client_ip(request)
         user = request.user if request.user.is_authenticated else None
 
-        rating, created = self.model.objects.get_or_create(
-            article_id=article_id,
-            ip_address=ip_address,
-            defaults={'value': value, 'user': user},
-        )
-
-        if not created:
-            if rating.value == value:
+        with transaction.atomic():
+            rating, created = self.model.objects.select_for_update().get_or_create(
+                article_id=article_id,
+                ip_address=ip_address,
+                defaults={'value': value, 'user': user},
+            )
+            if created:
+                status, delta = 'created', value
+            elif rating.value == value:
+                # повторный клик по той же оценке снимает её, сумму уменьшает сигнал subtract_deleted_rating
                 rating.delete()
-                return JsonResponse({'status': 'deleted', 'rating_sum': rating.article.get_sum_rating()})
+                status, delta = 'deleted', 0
             else:
+                status, delta = 'updated', value - rating.value
                 rating.value = value
                 rating.user = user
-                rating.save()
-                return JsonResponse({'status': 'updated', 'rating_sum': rating.article.get_sum_rating()})
-        return JsonResponse({'status': 'created', 'rating_sum': rating.article.get_sum_rating()})
\ No newline at end of file
+                rating.save(update_fields=('value', 'user'))
+            if delta:
+                Article.objects.filter(pk=article_id).update(rating_sum=F('rating_sum') + delta)
+
+        rating_sum = Article.objects.filter(pk=article_id).values_list('rating_sum', flat=True).first()
+        return JsonResponse({'status': status, 'rating_sum': rating_sum})
@@ -2,6 +2,7 @@ from celery import shared_task
 
 from modules.services.email import send_activate_email_message, send_contact_email_message
 from django.core.management import call_command
+from modules.blog.models import ViewCount
 
 
 
@@ -28,3 +29,12 @@ def dbackup_task():
     Выполнение резервного копирования базы данных
     """
     call_command('dbackup')
+
+
+@shared_task
+def create_view_count_task(article_id, ip_address):
+    """
+    1. Задача обрабатывается в миксине: ViewCountMixin
+    2. Создание записи о просмотре статьи вне цикла запроса
+    """
+    ViewCount.objects.get_or_create(article_id=article_id, ip_address=ip_address)
@@ -1,10 +1,15 @@
 from uuid import uuid4
+from hashlib import md5
 from pytils.translit import slugify
 import os
 from django.core.files.storage import FileSystemStorage
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.utils import timezone
 from selfincome import settings
 from urllib.parse import urljoin
-from datetime import datetime
+from datetime import datetime, timedelta
 from PIL import Image, ImageOps
 
 def unique_slugify(instance, slug):
@@ -28,6 +33,67 @@ def get_client_ip(request):
 
 
 
+def bump_cache_version(key):
+    """
+    Увеличение номера версии, входящего в ключи кэша (сброс всех ключей этой версии)
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+PAGINATOR_COUNT_VERSION_KEY = 'paginator-count-version'
+
+
+def reset_paginator_count_cache():
+    """
+    Сброс кэша количества объектов CachedCountPaginator (смена версии ключей)
+    """
+    bump_cache_version(PAGINATOR_COUNT_VERSION_KEY)
+
+
+ARTICLES_LAST_MODIFIED_KEY = 'articles-last-modified'
+
+
+def get_articles_last_modified():
+    """
+    Время последнего изменения списков статей (для заголовка Last-Modified)
+    """
+    return cache.get_or_set(ARTICLES_LAST_MODIFIED_KEY, timezone.now, None)
+
+
+def touch_articles_last_modified():
+    """
+    Обновление времени изменения списков статей: изменение/удаление статей и их тегов.
+    Счетчики (оценки, просмотры) его не трогают, см. AnonymousCacheMixin. Значение только растет и минимум на секунду (точность заголовка Last-Modified)
+    """
+    last_modified = timezone.now()
+    previous = cache.get(ARTICLES_LAST_MODIFIED_KEY)
+    if previous is not None and last_modified < previous + timedelta(seconds=1):
+        last_modified = previous + timedelta(seconds=1)
+    cache.set(ARTICLES_LAST_MODIFIED_KEY, last_modified, None)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор с кэшированием COUNT(*) по хэшу SQL запроса
+    """
+    cache_timeout = 60 * 5
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.is_empty():
+            return super().count
+        version = cache.get_or_set(PAGINATOR_COUNT_VERSION_KEY, 1, None)
+        cache_key = f'paginator-count:{version}:{md5(str(query).encode()).hexdigest()}'
+        count = cache.get(cache_key)
+        if count is None:
+            count = super().count
+            cache.set(cache_key, count, self.cache_timeout)
+        return count
+
 
 class CkeditorCustomStorage(FileSystemStorage):
     """
@@ -192,14 +192,13 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 
 
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-#
-#         'LOCATION': 'redis://localhost:6379',
-#
-#     }
-# }
+# Общий кэш для всех процессов (веб и celery): версии ключей, Last-Modified списков, кэш страниц
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }
+}
 
 
 
@@ -51,7 +51,7 @@ async function createComment(event) {
                                                 </p>
                                                 <a class="btn btn-sm btn-dark btn-reply" href="#commentForm" data-comment-id="${comment.id}" data-comment-username="${comment.author}">Ответить</a>
                                                 <hr/>
-                                                <time>${comment.time_create}</time>
+                                                <time datetime="${comment.time_create}">${comment.time_create_display}</time>
                                             </div>
                                         </div>
                                     </div>